@@ -0,0 +1,104 @@
+/*
+ * stuck_tool.py の --engine c 用カーネル（_metrics_kernel と同じ計算）。
+ *
+ * ビルド:
+ *   cc -O3 -march=native -shared -fPIC -o stuck_kernel.so stuck_kernel.c
+ *
+ * -ffast-math は付けない（加算の順序を入れ替えられると補償付き加算が消えてしまう）。
+ */
+
+#include <math.h>
+#include <stdint.h>
+
+/* stuck_tool.py の _C_KERNEL_ABI と揃える（rolling_pstd の引数や計算を変えたら両方上げる） */
+#define STUCK_KERNEL_ABI 1
+
+/* 古いビルドを読み込まないよう、stuck_tool.py がこの値を確かめる */
+int stuck_kernel_abi(void)
+{
+    return STUCK_KERNEL_ABI;
+}
+
+/* Neumaier: 大きい方を基準に落ちた下位ビットを *c に溜める */
+static inline void neumaier_add(double *s, double *c, double v)
+{
+    double t = *s + v;
+    if (fabs(*s) >= fabs(v))
+        *c += (*s - t) + v;
+    else
+        *c += (v - t) + *s;
+    *s = t;
+}
+
+/* a[lo..hi] の母分散を平均を引く 2 パスで求める */
+static double two_pass_pvar(const double *a, int64_t lo, int64_t hi)
+{
+    double m = 0.0, v = 0.0;
+    int64_t j;
+    for (j = lo; j <= hi; j++)
+        m += a[j];
+    m /= (double)(hi - lo + 1);
+    for (j = lo; j <= hi; j++)
+        v += (a[j] - m) * (a[j] - m);
+    return v / (double)(hi - lo + 1);
+}
+
+/*
+ * 連続する step のウィンドウ（サイズ W）ごとに max(pstdev(x), pstdev(z)) を求める。
+ * steps は昇順・重複なし。分散が refine × 二乗和の平均以下の窓は 2 パスで計算し直す。
+ * out_start / out_end / out に書き込み、書き込んだウィンドウ数を返す。
+ */
+int64_t rolling_pstd(const double *x, const double *z, const int64_t *steps,
+                     int64_t n, int64_t W, double refine,
+                     int64_t *out_start, int64_t *out_end, double *out)
+{
+    /* (Σx, Σx², Σz, Σz²) の和と補償項 */
+    double s[4] = {0.0, 0.0, 0.0, 0.0};
+    double c[4] = {0.0, 0.0, 0.0, 0.0};
+    double x0 = 0.0, z0 = 0.0;
+    int64_t run_len = 0, k = 0, i;
+
+    for (i = 0; i < n; i++) {
+        if (i == 0 || steps[i] != steps[i - 1] + 1) {
+            /* run の先頭の座標を原点にずらしてから足し込む（分散は変わらない） */
+            run_len = 0;
+            x0 = x[i];
+            z0 = z[i];
+            s[0] = s[1] = s[2] = s[3] = 0.0;
+            c[0] = c[1] = c[2] = c[3] = 0.0;
+        }
+        run_len++;
+
+        double dx = x[i] - x0, dz = z[i] - z0;
+        neumaier_add(&s[0], &c[0], dx);
+        neumaier_add(&s[1], &c[1], dx * dx);
+        neumaier_add(&s[2], &c[2], dz);
+        neumaier_add(&s[3], &c[3], dz * dz);
+        if (run_len > W) {
+            /* 窓から出る要素を引く */
+            double ox = x[i - W] - x0, oz = z[i - W] - z0;
+            neumaier_add(&s[0], &c[0], -ox);
+            neumaier_add(&s[1], &c[1], -ox * ox);
+            neumaier_add(&s[2], &c[2], -oz);
+            neumaier_add(&s[3], &c[3], -oz * oz);
+        }
+        if (run_len < W)
+            continue;
+
+        int64_t lo = i - W + 1;
+        double sx = s[0] + c[0], sx2 = s[1] + c[1];
+        double sz = s[2] + c[2], sz2 = s[3] + c[3];
+        double vx = sx2 / W - (sx / W) * (sx / W);
+        double vz = sz2 / W - (sz / W) * (sz / W);
+        if (vx <= refine * sx2 / W)
+            vx = two_pass_pvar(x, lo, i);
+        if (vz <= refine * sz2 / W)
+            vz = two_pass_pvar(z, lo, i);
+        double v = vx > vz ? vx : vz;
+        out_start[k] = steps[lo];
+        out_end[k] = steps[i];
+        out[k] = v > 0.0 ? sqrt(v) : 0.0;
+        k++;
+    }
+    return k;
+}
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""
+stuck_tool.py の --engine numba 用カーネル（stuck_kernel.c の rolling_pstd と同じ計算）。
+
+numba の import / コンパイルには時間がかかるので、stuck_tool.py からは
+--engine numba のときだけ import する。
+cache=True なのでコンパイル結果は __pycache__ に残り、2 回目以降は読み込むだけ。
+fastmath は付けない（加算の順序を入れ替えられると補償付き加算が消えてしまう）。
+"""
+
+import math
+
+from numba import njit
+
+@njit(cache=True)
+def neumaier_add(s, c, v):
+    """
+    Neumaier の補償付き加算。大きい方を基準に落ちた下位ビットを c に溜める。
+    Returns: (新しい和, 新しい補償項)
+    """
+    t = s + v
+    if abs(s) >= abs(v):
+        c += (s - t) + v
+    else:
+        c += (v - t) + s
+    return t, c
+
+@njit(cache=True)
+def two_pass_pvar(a, lo, hi):
+    """
+    a[lo..hi] の母分散を平均を引く 2 パスで求める。
+    """
+    m = 0.0
+    for j in range(lo, hi + 1):
+        m += a[j]
+    m /= hi - lo + 1
+    v = 0.0
+    for j in range(lo, hi + 1):
+        d = a[j] - m
+        v += d * d
+    return v / (hi - lo + 1)
+
+@njit(cache=True)
+def metrics_kernel(steps, x, z, W, refine, out_start, out_end, out_m):
+    """
+    ランニングサム（入る要素を足し、出る要素を引く）で窓ごとの指標を計算する。
+    和は Neumaier の補償付き加算で持つので、長い run でも丸め誤差が溜まらない。
+    それでも分散が refine × 二乗和の平均以下の窓（桁落ちの疑い）は、その窓だけ 2 パスで計算し直す。
+    Returns: 書き込んだウィンドウ数
+    """
+    n = steps.shape[0]
+    k = 0
+    run_len = 0
+    x0 = 0.0
+    z0 = 0.0
+    # (Σx, Σx², Σz, Σz²) の和と補償項
+    sx = cx = sx2 = cx2 = 0.0
+    sz = cz = sz2 = cz2 = 0.0
+    for i in range(n):
+        if i == 0 or steps[i] != steps[i - 1] + 1:
+            # run の先頭の座標を原点にずらしてから足し込む（分散は変わらない）
+            run_len = 0
+            x0 = x[i]
+            z0 = z[i]
+            sx = cx = sx2 = cx2 = 0.0
+            sz = cz = sz2 = cz2 = 0.0
+        run_len += 1
+
+        dx = x[i] - x0
+        dz = z[i] - z0
+        sx, cx = neumaier_add(sx, cx, dx)
+        sx2, cx2 = neumaier_add(sx2, cx2, dx * dx)
+        sz, cz = neumaier_add(sz, cz, dz)
+        sz2, cz2 = neumaier_add(sz2, cz2, dz * dz)
+        if run_len > W:
+            # 窓から出る要素を引く
+            ox = x[i - W] - x0
+            oz = z[i - W] - z0
+            sx, cx = neumaier_add(sx, cx, -ox)
+            sx2, cx2 = neumaier_add(sx2, cx2, -ox * ox)
+            sz, cz = neumaier_add(sz, cz, -oz)
+            sz2, cz2 = neumaier_add(sz2, cz2, -oz * oz)
+        if run_len < W:
+            continue
+
+        lo = i - W + 1
+        tx = sx + cx
+        tx2 = sx2 + cx2
+        tz = sz + cz
+        tz2 = sz2 + cz2
+        vx = tx2 / W - (tx / W) ** 2
+        vz = tz2 / W - (tz / W) ** 2
+        if vx <= refine * tx2 / W:
+            vx = two_pass_pvar(x, lo, i)
+        if vz <= refine * tz2 / W:
+            vz = two_pass_pvar(z, lo, i)
+        v = vx if vx > vz else vz
+        out_start[k] = steps[lo]
+        out_end[k] = steps[i]
+        out_m[k] = math.sqrt(v) if v > 0.0 else 0.0
+        k += 1
+    return k
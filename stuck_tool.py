@@ -25,72 +25,608 @@ Stuck 判定・しきい値サジェスト用スクリプト
 """
 
 import argparse
+import ctypes
+import datetime
+import functools
 import glob
-import json
+import hashlib
+import importlib.util
 import math
 import os
+import shutil
 import time
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import chain, groupby, islice, repeat
+from operator import itemgetter
 from statistics import pstdev
-from typing import Dict, List, Tuple, Iterable, Optional
+from typing import Dict, List, Sequence, Tuple, Iterable, Iterator, Optional
 
-def load_series_from_json(path: str) -> List[Tuple[int, float, float]]:
+# orjson があれば JSON のパースに使う（無ければ標準の json）
+try:
+    import orjson
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+except ImportError:
+    import json
+    _loads = json.loads
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+# NumPy があればウィンドウ計算をベクトル化する（無ければ純 Python で計算）
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+# ウィンドウ計算の実装。auto は stuck_kernel をビルド済みなら c、NumPy があれば numpy、無ければ python。
+# numba は import / コンパイルに時間がかかるので --engine numba のときだけ読み込む（カーネルは stuck_numba.py）。
+# c は stuck_kernel.c をビルドした共有ライブラリを ctypes で呼ぶ（NumPy 必須）。
+# exact は statistics.pstdev をそのまま使う参照実装（遅い）
+ENGINES = ("auto", "c", "numba", "numpy", "python", "exact")
+
+# (steps, xs, zs)。NumPy があれば ndarray、無ければ tuple
+Series = Tuple[Sequence[int], Sequence[float], Sequence[float]]
+
+# 指標の計算方法を変えたら上げる（古いキャッシュを捨てる）
+_CACHE_VERSION = 6
+# scan 結果のキャッシュ（ファイルが変わっていなければ読み直さない）。
+# データと一緒に配られたものを読まないよう、作業ディレクトリではなくユーザーのキャッシュディレクトリに置く。
+# (ファイル, window, engine) ごとに 1 ファイルで、NumPy があれば .npy、無ければ .json
+# （どちらも pickle と違い、読み込んでもコードは実行されない）
+_CACHE_ROOT = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "unstuck_checker",
+)
+_CACHE_DIR = os.path.join(_CACHE_ROOT, f"metrics-v{_CACHE_VERSION}")
+# キャッシュ全体の上限。超えたら最後に使われたのが古いエントリから消す
+_CACHE_MAX_BYTES = 64 << 20
+# 書き込みに失敗したら（読み取り専用・容量不足など）そのプロセスではもう書かない
+_cache_writable = True
+
+# detect / verify の画面出力を溜めておく一時ファイルのうち、メモリに置く上限（超えたらディスクへ）
+_SPOOL_MAX = 1 << 20
+
+# stuck_kernel.c の STUCK_KERNEL_ABI と揃える（rolling_pstd の引数や計算を変えたら両方上げる）
+_C_KERNEL_ABI = 1
+
+# 累積和を作り直す間隔（窓の開始位置の数）。大きいほど桁落ちしやすい
+_PREFIX_BLOCK = 64
+# 累積和から求めた分散がこの比率 × (足し込んだ二乗和の平均) 以下なら桁落ちを疑い、
+# 純 Python 版では窓の値から計算し直す
+_REFINE_RATIO = 1e-9
+
+def load_series_from_json(path: str) -> Series:
     """
-    JSON ファイルから (step, x, z) のリストを読み込む。
+    JSON ファイルから step 昇順の (steps, xs, zs) を読み込む。
+    NumPy があれば読み取り専用の ndarray、無ければ tuple で返す。
+    同じファイル（更新時刻も同じ）はプロセス内でキャッシュしたものを返す（ライブラリとして繰り返し読む場合向け）。
     不正フォーマットは ValueError。
     """
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    return _load_cached(path, os.stat(path).st_mtime_ns)
+
+@functools.lru_cache(maxsize=128)
+def _load_cached(path: str, mtime_ns: int) -> Series:
+    # mtime_ns はキャッシュキーのためだけの引数（ファイルが更新されたら読み直す）
+    return _load_arrays(path)
+
+def _load_arrays(path: str) -> Series:
+    """
+    load_series_from_json の本体（キャッシュなし）。
+    CLI の走査は各ファイルを 1 回しか読まないので、キャッシュに残さないようこちらを直接使う。
+    """
+    with open(path, "rb") as f:
+        data = _loads(f.read())
     if "locations" not in data or not isinstance(data["locations"], list):
         raise ValueError(f"{path}: 'locations' が見つからないか不正です。")
-    series = []
-    for item in data["locations"]:
+    locs = data["locations"]
+    n = len(locs)
+    # (step, x, z) のタプルは作らず、列ごとの list に直接詰める
+    steps: List[int] = [0] * n
+    xs: List[float] = [0.0] * n
+    zs: List[float] = [0.0] * n
+    for i, item in enumerate(locs):
         try:
-            step = int(item["step"])
-            x = float(item["x"])
-            z = float(item["z"])
+            steps[i] = int(item["step"])
+            # パーサーが返した値がすでに float なら変換しない
+            x = item["x"]
+            xs[i] = x if type(x) is float else float(x)
+            z = item["z"]
+            zs[i] = z if type(z) is float else float(z)
         except Exception as e:
             raise ValueError(f"{path}: locations の要素が不正です: {e}")
-        series.append((step, x, z))
-    # step で昇順に
-    series.sort(key=lambda t: t[0])
-    return series
+    # step で昇順に（同じ step の順序は保つ）
+    if np is not None:
+        steps_np = np.array(steps, dtype=np.int64)
+        xs_np = np.array(xs, dtype=np.float64)
+        zs_np = np.array(zs, dtype=np.float64)
+        if n > 1 and (np.diff(steps_np) < 0).any():
+            idx = np.argsort(steps_np, kind="stable")
+            steps_np, xs_np, zs_np = steps_np[idx], xs_np[idx], zs_np[idx]
+        # キャッシュして共有するので書き換えられないようにしておく
+        for arr in (steps_np, xs_np, zs_np):
+            arr.setflags(write=False)
+        return steps_np, xs_np, zs_np
+    if any(steps[i] < steps[i-1] for i in range(1, n)):
+        order = sorted(range(n), key=steps.__getitem__)
+        steps = [steps[i] for i in order]
+        xs = [xs[i] for i in order]
+        zs = [zs[i] for i in order]
+    return tuple(steps), tuple(xs), tuple(zs)
+
+def contiguous_runs(steps: List[int]) -> List[Tuple[int, int]]:
+    """
+    steps（昇順・重複なし想定）を 1 回走査し、連続した区間を返す。
+    例: [1,2,3,7,8] -> [(0,3),(3,2)]
+
+    Returns: list of (run_start_idx, run_len)
+    """
+    if not steps:
+        return []
+    runs: List[Tuple[int, int]] = []
+    run_start = 0
+    for i in range(1, len(steps)):
+        if steps[i] != steps[i-1] + 1:
+            runs.append((run_start, i - run_start))
+            run_start = i
+    runs.append((run_start, len(steps) - run_start))
+    return runs
 
 def contiguous_window_metrics(
-    series: List[Tuple[int, float, float]],
+    series: Series,
     window: int,
+    engine: str = "auto",
+    max_metric: Optional[float] = None,
 ) -> Iterable[Tuple[int, int, float]]:
     """
     連続する step のウィンドウ（サイズ window）ごとに指標を返す。
     指標は max(pstdev(x), pstdev(z))。
     欠番があればそのウィンドウはスキップ。
+    engine は ENGINES のいずれか（c / numba / numpy は NumPy 必須）。
+    max_metric を指定すると metric <= max_metric のウィンドウだけを返す。
 
     Returns: (start_step, end_step, metric)
     """
-    if not series:
+    steps, xs, zs = series
+    if len(steps) == 0:
         return
-    # step -> (x, z) に辞書化
-    by_step: Dict[int, Tuple[float, float]] = {s: (x, z) for s, x, z in series}
-    steps_sorted = [s for s, _, _ in series]
-    min_step, max_step = steps_sorted[0], steps_sorted[-1]
-    # 開始は min_step から max_step-window+1 まで
-    for start in range(min_step, max_step - window + 2):
-        end = start + window - 1
-        # 連続性チェック（欠番があればスキップ）
-        ok = all((s in by_step) for s in range(start, end + 1))
-        if not ok:
+    engine = _resolve_engine(engine)
+    if engine == "c":
+        yield from _window_metrics_c(steps, xs, zs, window, max_metric)
+    elif engine == "numba":
+        yield from _window_metrics_numba(steps, xs, zs, window, max_metric)
+    elif engine == "numpy":
+        yield from _window_metrics_numpy(steps, xs, zs, window, max_metric)
+    else:
+        if np is not None and isinstance(steps, np.ndarray):
+            steps, xs, zs = steps.tolist(), xs.tolist(), zs.tolist()
+        if engine == "exact":
+            yield from _window_metrics_exact(steps, xs, zs, window, max_metric)
+        else:
+            yield from _window_metrics_python(steps, xs, zs, window, max_metric)
+
+def _resolve_engine(engine: str) -> str:
+    """
+    auto を実際に使う実装名に解決する（stuck_kernel をビルド済みなら c、NumPy があれば numpy、無ければ python）。
+    """
+    if engine != "auto":
+        return engine
+    if np is None:
+        return "python"
+    return "c" if _c_kernel() is not None else "numpy"
+
+def _dedup_steps_numpy(steps, xs, zs):
+    """
+    同じ step が重複していれば後勝ちにする（辞書化していたときと同じ挙動）。
+    """
+    keep = np.append(np.diff(steps) != 0, True)
+    if keep.all():
+        return steps, xs, zs
+    return steps[keep], xs[keep], zs[keep]
+
+def _window_metrics_numba(
+    steps,
+    xs,
+    zs,
+    window: int,
+    max_metric: Optional[float] = None,
+) -> Iterable[Tuple[int, int, float]]:
+    """
+    contiguous_window_metrics の Numba 版。
+    """
+    steps, xs, zs = _dedup_steps_numpy(steps, xs, zs)
+    n = len(steps)
+    out_start = np.empty(n, dtype=np.int64)
+    out_end = np.empty(n, dtype=np.int64)
+    out_m = np.empty(n, dtype=np.float64)
+    k = _numba_kernel()(steps, xs, zs, window, _REFINE_RATIO, out_start, out_end, out_m)
+    out_start, out_end, out_m = out_start[:k], out_end[:k], out_m[:k]
+    if max_metric is not None:
+        mask = out_m <= max_metric
+        out_start, out_end, out_m = out_start[mask], out_end[mask], out_m[mask]
+    yield from zip(out_start.tolist(), out_end.tolist(), out_m.tolist())
+
+def _window_metrics_c(
+    steps,
+    xs,
+    zs,
+    window: int,
+    max_metric: Optional[float] = None,
+) -> Iterable[Tuple[int, int, float]]:
+    """
+    contiguous_window_metrics の C 版（stuck_kernel.c）。
+    """
+    steps, xs, zs = _dedup_steps_numpy(steps, xs, zs)
+    # C 側は int64 / float64 の連続配列を受け取る（読込結果はそのまま渡せるのでコピーは起きない）
+    steps = np.ascontiguousarray(steps, dtype=np.int64)
+    xs = np.ascontiguousarray(xs, dtype=np.float64)
+    zs = np.ascontiguousarray(zs, dtype=np.float64)
+    n = len(steps)
+    out_start = np.empty(n, dtype=np.int64)
+    out_end = np.empty(n, dtype=np.int64)
+    out_m = np.empty(n, dtype=np.float64)
+    k = _c_kernel()(xs, zs, steps, n, window, _REFINE_RATIO, out_start, out_end, out_m)
+    out_start, out_end, out_m = out_start[:k], out_end[:k], out_m[:k]
+    if max_metric is not None:
+        mask = out_m <= max_metric
+        out_start, out_end, out_m = out_start[mask], out_end[mask], out_m[mask]
+    yield from zip(out_start.tolist(), out_end.tolist(), out_m.tolist())
+
+@functools.lru_cache(maxsize=None)
+def _c_kernel():
+    """
+    スクリプトと同じディレクトリにある stuck_kernel の共有ライブラリを読み込み、rolling_pstd を返す。
+    ビルドされていない・読み込めない・古い stuck_kernel.c からビルドされている
+    （stuck_kernel_abi() が _C_KERNEL_ABI と違う）ときは None。
+    """
+    if np is None:
+        return None
+    here = os.path.dirname(os.path.abspath(__file__))
+    for lib_path in sorted(glob.glob(os.path.join(here, "stuck_kernel*"))):
+        if not lib_path.endswith((".so", ".dylib", ".dll")):
+            continue
+        try:
+            lib = ctypes.CDLL(lib_path)
+            abi = lib.stuck_kernel_abi
+            fn = lib.rolling_pstd
+        except (OSError, AttributeError):
+            continue
+        abi.argtypes = []
+        abi.restype = ctypes.c_int
+        if abi() != _C_KERNEL_ABI:
+            continue
+        f64 = np.ctypeslib.ndpointer(np.float64, flags="C_CONTIGUOUS")
+        i64 = np.ctypeslib.ndpointer(np.int64, flags="C_CONTIGUOUS")
+        fn.argtypes = [f64, f64, i64, ctypes.c_int64, ctypes.c_int64, ctypes.c_double, i64, i64, f64]
+        fn.restype = ctypes.c_int64
+        return fn
+    return None
+
+@functools.lru_cache(maxsize=None)
+def _numba_kernel():
+    """
+    stuck_numba.metrics_kernel を返す（numba はここで初めて import する）。
+    カーネルとヘルパーは stuck_numba.py のモジュールレベルで @njit(cache=True) しているので、
+    コンパイル結果は __pycache__ から読み込まれ、2 回目以降のプロセスではコンパイルしない。
+    """
+    from stuck_numba import metrics_kernel
+    return metrics_kernel
+
+def _window_metrics_numpy(
+    steps,
+    xs,
+    zs,
+    window: int,
+    max_metric: Optional[float] = None,
+) -> Iterable[Tuple[int, int, float]]:
+    """
+    contiguous_window_metrics の NumPy 版。
+    run ごとに _rolling_pvar で全ウィンドウの母分散をまとめて計算する。
+    """
+    steps, xs, zs = _dedup_steps_numpy(steps, xs, zs)
+    bounds = np.flatnonzero(np.diff(steps) != 1) + 1
+    for s_run, x_run, z_run in zip(np.split(steps, bounds), np.split(xs, bounds), np.split(zs, bounds)):
+        if len(s_run) < window:
             continue
-        xs = [by_step[s][0] for s in range(start, end + 1)]
-        zs = [by_step[s][1] for s in range(start, end + 1)]
-        # 窓サイズが 1 のとき pstdev は 0 とする（statistics.pstdev も 0 を返す）
-        metric = max(pstdev(xs), pstdev(zs))
-        yield (start, end, metric)
+        # max(pstdev(x), pstdev(z)) = sqrt(max(var(x), var(z))) なので sqrt は 1 回でよい
+        var = np.maximum(_rolling_pvar(x_run, window), _rolling_pvar(z_run, window))
+        metric = np.sqrt(np.maximum(var, 0.0))
+        starts = s_run[:len(metric)]
+        ends = s_run[window - 1:]
+        if max_metric is not None:
+            mask = metric <= max_metric
+            metric, starts, ends = metric[mask], starts[mask], ends[mask]
+        yield from zip(starts.tolist(), ends.tolist(), metric.tolist())
+
+def _rolling_pvar(a, window: int):
+    """
+    a の長さ window の各ウィンドウの母分散（長さ len(a)-window+1）を返す。
+    cumsum の差で Σx, Σx² を求めるので O(N)。
+    """
+    a64 = a.astype(np.float64)
+    nw = len(a64) - window + 1
+    # 出力 B 個ぶんの区間ごとに、区間の先頭を原点にして cumsum し直す（誤差が区間の外に溜まらない）
+    B = max(_PREFIX_BLOCK, window)
+    nb = -(-nw // B)
+    padded = np.concatenate((a64, np.full(nb * B - nw, a64[-1])))
+    segs = sliding_window_view(padded, B + window - 1)[::B]
+    d = segs - segs[:, :1]
+    zero = np.zeros((nb, 1))
+    c = np.concatenate((zero, np.cumsum(d, axis=1)), axis=1)
+    c2 = np.concatenate((zero, np.cumsum(d * d, axis=1)), axis=1)
+    s = (c[:, window:] - c[:, :-window]).ravel()[:nw]
+    s2 = (c2[:, window:] - c2[:, :-window]).ravel()[:nw]
+    var = s2 / window - (s / window) ** 2
+    # 分散が累積和に比べて小さすぎる（≒ 桁落ちしている）窓だけ、平均を引く 2 パスで計算し直す
+    bad = var <= _REFINE_RATIO * c2[:, window:].ravel()[:nw] / window
+    if bad.any():
+        var[bad] = sliding_window_view(a64, window)[bad].var(axis=1)
+    return var
+
+def _dedup_steps_python(steps: Sequence[int], xs: Sequence[float], zs: Sequence[float]):
+    """
+    同じ step が重複していれば後勝ちにする（辞書化していたときと同じ挙動）。
+    """
+    if all(steps[i] != steps[i-1] for i in range(1, len(steps))):
+        return steps, xs, zs
+    dedup: Dict[int, Tuple[float, float]] = {s: (x, z) for s, x, z in zip(steps, xs, zs)}
+    steps = sorted(dedup)
+    return steps, [dedup[s][0] for s in steps], [dedup[s][1] for s in steps]
+
+def _window_metrics_exact(
+    steps: Sequence[int],
+    xs: Sequence[float],
+    zs: Sequence[float],
+    window: int,
+    max_metric: Optional[float] = None,
+) -> Iterable[Tuple[int, int, float]]:
+    """
+    contiguous_window_metrics の参照実装。run ごとの list をスライスして statistics.pstdev に渡す。
+    遅いが、ほかの実装の値を確かめるときの基準になる。
+    """
+    steps, xs, zs = _dedup_steps_python(steps, xs, zs)
+    for run_start, run_len in contiguous_runs(steps):
+        run_end = run_start + run_len
+        steps_run = steps[run_start:run_end]
+        xs_run = xs[run_start:run_end]
+        zs_run = zs[run_start:run_end]
+        for i in range(run_len - window + 1):
+            metric = max(pstdev(xs_run[i:i + window]), pstdev(zs_run[i:i + window]))
+            if max_metric is None or metric <= max_metric:
+                yield (steps_run[i], steps_run[i + window - 1], metric)
+
+def _window_metrics_python(
+    steps: Sequence[int],
+    xs: Sequence[float],
+    zs: Sequence[float],
+    window: int,
+    max_metric: Optional[float] = None,
+) -> Iterable[Tuple[int, int, float]]:
+    """
+    contiguous_window_metrics の純 Python 版（NumPy が無いとき用）。
+    """
+    steps, xs, zs = _dedup_steps_python(steps, xs, zs)
+    w = window
+    for run_start, run_len in contiguous_runs(steps):
+        # 累積和で窓ごとの分散を O(1) で求める: σ² = Σx²/W − (Σx/W)²
+        # 累積和が大きくなると桁落ちするので、_PREFIX_BLOCK 窓ごとに
+        # 区間を切り出し、その先頭座標を原点にずらしてから足し込む
+        run_end = run_start + run_len
+        for base in range(run_start, run_end - w + 1, _PREFIX_BLOCK):
+            m = min(run_end, base + _PREFIX_BLOCK + w - 1) - base
+            x0, z0 = xs[base], zs[base]
+            csx = [0.0] * (m + 1)
+            csx2 = [0.0] * (m + 1)
+            csz = [0.0] * (m + 1)
+            csz2 = [0.0] * (m + 1)
+            for i in range(m):
+                dx = xs[base + i] - x0
+                dz = zs[base + i] - z0
+                csx[i + 1] = csx[i] + dx
+                csx2[i + 1] = csx2[i] + dx * dx
+                csz[i + 1] = csz[i] + dz
+                csz2[i + 1] = csz2[i] + dz * dz
+            for i in range(m - w + 1):
+                sx = csx[i + w] - csx[i]
+                sx2 = csx2[i + w] - csx2[i]
+                sz = csz[i + w] - csz[i]
+                sz2 = csz2[i + w] - csz2[i]
+                varx = sx2 / w - (sx / w) ** 2
+                varz = sz2 / w - (sz / w) ** 2
+                # 分散が累積和に比べて小さすぎる（≒ 桁落ちしている）ときは窓の値から計算し直す
+                if varx <= _REFINE_RATIO * csx2[i + w] / w:
+                    varx = _pvar_fast(xs[base + i:base + i + w])
+                if varz <= _REFINE_RATIO * csz2[i + w] / w:
+                    varz = _pvar_fast(zs[base + i:base + i + w])
+                # max(pstdev(x), pstdev(z)) = sqrt(max(var(x), var(z))) なので sqrt は 1 回でよい
+                # 窓サイズが 1 のとき分散は 0（statistics.pstdev と同じ）
+                vmax = varx if varx > varz else varz
+                metric = math.sqrt(vmax) if vmax > 0.0 else 0.0
+                if max_metric is None or metric <= max_metric:
+                    yield (steps[base + i], steps[base + i + w - 1], metric)
 
-def scan_glob_for_metrics(glob_pattern: str, window: int) -> List[Tuple[str, int, int, float]]:
+def _resolve_paths(glob_pattern: str) -> Tuple[str, ...]:
+    """
+    グロブに一致する JSON のパスを昇順で返す。
+    結果はキャッシュしない（** の下のディレクトリの更新まで見るには結局ツリー全体を走査する必要がある）。
+    """
+    paths = sorted(glob.glob(glob_pattern, recursive=True))
+    # パターン自体が *.json で終わっていれば拡張子の再チェックは不要
+    if glob_pattern.lower().endswith(".json"):
+        return tuple(paths)
+    return tuple(p for p in paths if p.lower().endswith(".json"))
+
+def _process_one(
+    path: str,
+    window: int,
+    engine: str = "auto",
+    max_metric: Optional[float] = None,
+) -> Tuple[List[Tuple[str, int, int, float]], Optional[str]]:
+    """
+    1 ファイル分の読込 + ウィンドウ計算（ワーカープロセスで実行される）。
+    Returns: (list of (path, start_step, end_step, metric), 読込失敗時のエラーメッセージ)
+    """
+    try:
+        series = _load_arrays(path)
+    except Exception as e:
+        return [], str(e)
+    return [(path, start, end, m) for start, end, m in contiguous_window_metrics(series, window, engine, max_metric)], None
+
+def _cache_entry_path(path: str, window: int, engine: str) -> Optional[str]:
+    """
+    path の (window, engine) の結果を置くキャッシュファイルのパス。
+    ファイルの更新時刻・サイズも名前に含めるので、ファイルが変われば別のエントリになる
+    （古いエントリは _prune_metrics_cache が容量の上限に従って消す）。
+    ファイルが stat できなければ None。
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = f"{os.path.abspath(path)}\0{window}\0{engine}\0{st.st_mtime_ns}\0{st.st_size}"
+    suffix = ".npy" if np is not None else ".json"
+    return os.path.join(_CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + suffix)
+
+def _cache_lookup(path: str, entry_path: str) -> Optional[List[Tuple[str, int, int, float]]]:
+    """
+    キャッシュ済みの結果を読む。無い・壊れているときは None。
+    """
+    try:
+        if np is not None:
+            value = np.load(entry_path, allow_pickle=False)
+            if value.ndim != 2 or value.shape[1] != 3:
+                return None
+        else:
+            with open(entry_path, "rb") as f:
+                value = _loads(f.read())
+        # 最後に使った時刻として更新時刻を使う（_prune_metrics_cache は古い順に消す）
+        os.utime(entry_path)
+    except (OSError, ValueError):
+        return None
+    if np is not None:
+        starts = value[:, 0].astype(np.int64).tolist()
+        ends = value[:, 1].astype(np.int64).tolist()
+        return list(zip(repeat(path), starts, ends, value[:, 2].tolist()))
+    return [(path, start, end, m) for start, end, m in value]
+
+def _cache_store(entry_path: str, rows: List[Tuple[str, int, int, float]]) -> bool:
+    """
+    結果を entry_path に書く。同時に走る別プロセスと混ざらないよう、一時ファイルに書いてから置き換える。
+    書けなかったときは警告を 1 回だけ出し、以降このプロセスではキャッシュに書かない。
+    Returns: 書けたかどうか
+    """
+    global _cache_writable
+    if not _cache_writable:
+        return False
+    tmp_path = None
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            if np is not None:
+                np.save(f, np.array([r[1:] for r in rows], dtype=np.float64).reshape(-1, 3))
+            else:
+                f.write(_dumps([r[1:] for r in rows]))
+        os.replace(tmp_path, entry_path)
+        return True
+    except OSError as e:
+        _cache_writable = False
+        print(f"[WARN] キャッシュに書き込めませんでした: {_CACHE_DIR}: {e}", flush=True)
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return False
+
+def _prune_metrics_cache() -> None:
+    """
+    キャッシュ全体が _CACHE_MAX_BYTES に収まるよう、最後に使われたのが古いエントリから消す。
+    消えたファイルや更新されたファイルのエントリは使われなくなるので、いずれここで消える。
+    別バージョンのキャッシュ（_CACHE_ROOT 直下の他のもの）もまとめて消す。
+    """
+    try:
+        for name in os.listdir(_CACHE_ROOT):
+            other = os.path.join(_CACHE_ROOT, name)
+            if other == _CACHE_DIR:
+                continue
+            if os.path.isdir(other):
+                shutil.rmtree(other, ignore_errors=True)
+            else:
+                os.remove(other)
+        entries = []
+        with os.scandir(_CACHE_DIR) as it:
+            for entry in it:
+                st = entry.stat()
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total <= _CACHE_MAX_BYTES:
+                break
+            os.remove(entry_path)
+            total -= size
+    except OSError:
+        # 掃除できなくても結果には影響しない
+        pass
+
+def _pvar_fast(vals: Sequence[float]) -> float:
+    """
+    statistics.pvariance の代わり。math.fsum（C 実装の補償付き総和）で平均と偏差平方和を求める。
+    分数で厳密に計算する pvariance より速く、窓サイズ程度の長さなら精度も十分。
+    sqrt は呼び出し側で x / z の大きい方に 1 回だけ取る。
+    """
+    n = len(vals)
+    mean = math.fsum(vals) / n
+    return max(0.0, math.fsum((v - mean) * (v - mean) for v in vals) / n)
+
+def _ordered_pool_map(ex: ProcessPoolExecutor, fn, items: Sequence, max_pending: int) -> Iterator:
+    """
+    ex.map と同じく items の順に結果を返すが、先に投入しておくタスクを max_pending 件までに抑える。
+    ex.map は全タスクを最初に投入するため、先頭のファイルが遅いと後続の結果がすべて溜まってしまう。
+    """
+    it = iter(items)
+    pending = deque(ex.submit(fn, item) for item in islice(it, max_pending))
+    while pending:
+        fut = pending.popleft()
+        for item in islice(it, 1):
+            pending.append(ex.submit(fn, item))
+        yield fut.result()
+
+def scan_glob_for_metrics(
+    glob_pattern: str,
+    window: int,
+    jobs: Optional[int] = None,
+    use_cache: bool = False,
+    engine: str = "auto",
+    max_metric: Optional[float] = None,
+) -> List[Tuple[str, int, int, float]]:
     """
     グロブに一致する全 JSON からウィンドウごとの metric を収集。
     Returns: list of (path, start_step, end_step, metric)
     """
+    return list(_iter_metrics(glob_pattern, window, jobs=jobs, use_cache=use_cache, engine=engine, max_metric=max_metric))
+
+def _iter_metrics(
+    glob_pattern: str,
+    window: int,
+    jobs: Optional[int] = None,
+    use_cache: bool = False,
+    engine: str = "auto",
+    max_metric: Optional[float] = None,
+) -> Iterator[Tuple[str, int, int, float]]:
+    """
+    scan_glob_for_metrics のジェネレーター版。全ウィンドウの list を作らず、
+    ファイル順に (path, start_step, end_step, metric) を yield する。
+    ファイルごとに独立なので ProcessPoolExecutor で並列に処理する。
+    jobs はワーカー数（None なら CPU 数、1 なら並列化しない）。
+    use_cache なら _CACHE_DIR のキャッシュを使い、変更のないファイルは読み直さない。
+    engine / max_metric は contiguous_window_metrics に渡す。
+    max_metric を指定すると閾値を超えるウィンドウはワーカー側で捨てる（結果の list を小さくする）。
+    """
     # 内部ヘルパー: 進捗バー（同じ行上書き）
     def _print_bar(cur: int, total: int, label: str = "") -> None:
         if total <= 0:
@@ -105,9 +641,7 @@ def scan_glob_for_metrics(glob_pattern: str, window: int) -> List[Tuple[str, int
             sys.stdout.write("\n")
             sys.stdout.flush()
 
-    results: List[Tuple[str, int, int, float]] = []
-    paths_all = sorted(glob.glob(glob_pattern, recursive=True))
-    json_paths = [p for p in paths_all if p.lower().endswith(".json")]
+    json_paths = _resolve_paths(glob_pattern)
     total = len(json_paths)
 
     # 50ステップ程度で更新される頻度にする（最小1）
@@ -115,30 +649,63 @@ def scan_glob_for_metrics(glob_pattern: str, window: int) -> List[Tuple[str, int
     # 見出し
     print(f"[SCAN] {glob_pattern}  files={total}", flush=True)
 
-    for i, path in enumerate(json_paths, 1):
-        try:
-            series = load_series_from_json(path)
-        except Exception as e:
-            print(f"[WARN] 読込失敗: {path}: {e}", flush=True)
+    # キャッシュに載っているファイルは計算しない（中身は順番が来たときに 1 ファイルずつ読む）
+    # auto は環境によって実装が変わるので、実際に使う実装名でキャッシュを引く
+    cache_engine = _resolve_engine(engine)
+    entry_paths: List[Optional[str]] = [None] * total
+    cached = [False] * total
+    if use_cache:
+        for i, path in enumerate(json_paths):
+            entry_paths[i] = _cache_entry_path(path, window, cache_engine)
+            cached[i] = entry_paths[i] is not None and os.path.exists(entry_paths[i])
+    todo = [path for path, hit in zip(json_paths, cached) if not hit]
+    work = functools.partial(_process_one, window=window, engine=engine, max_metric=max_metric)
+    stored = False
+
+    def _consume(computed) -> Iterator[Tuple[str, int, int, float]]:
+        nonlocal stored
+        computed = iter(computed)
+        for i, (path, entry_path, hit) in enumerate(zip(json_paths, entry_paths, cached), 1):
+            rows = _cache_lookup(path, entry_path) if hit else None
+            if rows is not None:
+                err = None
+                if max_metric is not None:
+                    rows = [r for r in rows if r[3] <= max_metric]
+            else:
+                # 見えていたエントリが読めなかったとき（他のプロセスが消したなど）はここで計算する
+                rows, err = work(path) if hit else next(computed)
+                # 絞り込んだ結果はキャッシュしない（キャッシュは常に全ウィンドウ）
+                if entry_path is not None and err is None and max_metric is None:
+                    stored = _cache_store(entry_path, rows) or stored
+            if err is not None:
+                print(f"[WARN] 読込失敗: {path}: {err}", flush=True)
+            yield from rows
             # 進捗の更新
             if (i % step == 0) or (i == total):
                 _print_bar(i, total, label="files")
-            continue
-        for start, end, m in contiguous_window_metrics(series, window):
-            results.append((path, start, end, m))
-        # 進捗の更新
-        if (i % step == 0) or (i == total):
-            _print_bar(i, total, label="files")
 
-    return results
+    # 1 CPU ならワーカーを立てても起動（numba の import など）が増えるだけ
+    workers = jobs or os.cpu_count() or 1
+    if workers == 1 or len(todo) <= 1:
+        yield from _consume(map(work, todo))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            yield from _consume(_ordered_pool_map(ex, work, todo, max_pending=workers * 4))
+    if stored:
+        _prune_metrics_cache()
 
-def longest_contiguous_run(steps: List[int]) -> int:
+def longest_contiguous_run(steps: Sequence[int]) -> int:
     """
     steps（昇順想定）中で、連続した整数列の最長長さを返す。
     例: [1,2,3,7,8] -> 3
     """
-    if not steps:
+    if len(steps) == 0:
         return 0
+    if np is not None:
+        arr = np.asarray(steps, dtype=np.int64)
+        # 連続が途切れる位置（両端を含む）の間隔が各 run の長さ
+        edges = np.flatnonzero(np.concatenate(([True], np.diff(arr) != 1, [True])))
+        return int(np.diff(edges).max())
     longest = 1
     cur = 1
     for i in range(1, len(steps)):
@@ -149,13 +716,17 @@ def longest_contiguous_run(steps: List[int]) -> int:
             cur = 1
     return longest
 
-def missing_ranges(steps: List[int]) -> List[Tuple[int, int]]:
+def missing_ranges(steps: Sequence[int]) -> List[Tuple[int, int]]:
     """
     steps（昇順想定）における欠番区間を返す。
     例: [1,2,5,6,9] -> [(3,4),(7,8)]
     """
-    if not steps:
+    if len(steps) == 0:
         return []
+    if np is not None:
+        arr = np.asarray(steps, dtype=np.int64)
+        breaks = np.flatnonzero(np.diff(arr) > 1)
+        return list(zip((arr[breaks] + 1).tolist(), (arr[breaks + 1] - 1).tolist()))
     gaps: List[Tuple[int, int]] = []
     for i in range(1, len(steps)):
         expected_next = steps[i-1] + 1
@@ -175,25 +746,23 @@ def cmd_diagnose(args: argparse.Namespace) -> None:
     any_file = False
     for kind, glob_pattern in (("stuck", args.stuck_glob), ("unstuck", args.unstuck_glob)):
         print(f"\n[{kind}] {glob_pattern}")
-        paths = sorted(glob.glob(glob_pattern, recursive=True))
+        paths = _resolve_paths(glob_pattern)
         if not paths:
             print("  (一致するファイルがありません)")
             continue
         for path in paths:
-            if not path.lower().endswith(".json"):
-                continue
             any_file = True
             try:
-                series = load_series_from_json(path)
+                series = _load_arrays(path)
             except Exception as e:
                 print(f"  {path}\n    [ERROR] 読込失敗: {e}")
                 continue
-            steps = [s for s, _, _ in series]
-            unique_steps = sorted(set(steps))
+            steps = series[0]
+            unique_steps = np.unique(steps) if np is not None else sorted(set(steps))
             lc = longest_contiguous_run(unique_steps)
             gaps = missing_ranges(unique_steps)
-            min_s = unique_steps[0] if unique_steps else None
-            max_s = unique_steps[-1] if unique_steps else None
+            min_s = int(unique_steps[0]) if len(unique_steps) else None
+            max_s = int(unique_steps[-1]) if len(unique_steps) else None
             print(f"  {path}")
             print(f"    steps: total={len(steps)} unique={len(unique_steps)} min={min_s} max={max_s}")
             print(f"    longest contiguous run: {lc}  (必要: {args.window})")
@@ -210,18 +779,29 @@ def cmd_diagnose(args: argparse.Namespace) -> None:
     if not any_file:
         print("\n※ グロブが間違っている可能性があります。--stuck-glob / --unstuck-glob を確認してください。作業ディレクトリも確認してください。")
 
+def _scan_options(args: argparse.Namespace) -> Dict[str, object]:
+    """
+    共通オプションから _iter_metrics / scan_glob_for_metrics に渡すキーワード引数を作る。
+    """
+    return {"jobs": args.jobs, "use_cache": not args.no_cache, "engine": args.engine}
+
 def cmd_suggest(args: argparse.Namespace) -> None:
-    stuck_metrics = scan_glob_for_metrics(args.stuck_glob, args.window)
-    unstuck_metrics = scan_glob_for_metrics(args.unstuck_glob, args.window)
+    scan_opts = _scan_options(args)
+    # 全ウィンドウを list にせず、流しながら最大 / 最小だけ取る（ウィンドウが無ければ nan）
+    stuck_max = max(
+        (m for _, _, _, m in _iter_metrics(args.stuck_glob, args.window, **scan_opts)),
+        default=float("nan"),
+    )
+    unstuck_min = min(
+        (m for _, _, _, m in _iter_metrics(args.unstuck_glob, args.window, **scan_opts)),
+        default=float("nan"),
+    )
 
-    if not stuck_metrics:
+    if math.isnan(stuck_max):
         print("[WARN] stuck 側で計算できるウィンドウがありませんでした。")
-    if not unstuck_metrics:
+    if math.isnan(unstuck_min):
         print("[WARN] unstuck 側で計算できるウィンドウがありませんでした。")
 
-    stuck_max = max((m for _, _, _, m in stuck_metrics), default=float("nan"))
-    unstuck_min = min((m for _, _, _, m in unstuck_metrics), default=float("nan"))
-
     print("=== SUGGEST (window = {}) ===".format(args.window))
     print("stuck の指標 最大値: {}".format(stuck_max))
     print("unstuck の指標 最小値: {}".format(unstuck_min))
@@ -234,19 +814,24 @@ def cmd_suggest(args: argparse.Namespace) -> None:
 
 def cmd_detect(args: argparse.Namespace) -> None:
     # 両方（stuck/unstuck）まとめて走査してもよいし、どちらか片方でも OK。
-    all_metrics = []
-    all_metrics += scan_glob_for_metrics(args.stuck_glob, args.window)
-    all_metrics += scan_glob_for_metrics(args.unstuck_glob, args.window)
-
     thr = args.threshold
-    print("=== DETECT (window = {}, threshold = {}) ===".format(args.window, thr))
-    any_flag = False
-    for path, start, end, m in all_metrics:
-        if m <= thr:
-            any_flag = True
-            print(f"[STUCK] {path}  steps {start}..{end}  metric={m:.6f}")
-    if not any_flag:
-        print("→ stuck 判定は見つかりませんでした。")
+    scan_opts = _scan_options(args)
+    # 閾値以下のウィンドウだけを走査側で残す
+    all_flagged = chain(
+        _iter_metrics(args.stuck_glob, args.window, max_metric=thr, **scan_opts),
+        _iter_metrics(args.unstuck_glob, args.window, max_metric=thr, **scan_opts),
+    )
+    # 出力は進捗バーと混ざらないよう一時ファイルに書いておき、走査後にまとめて出す
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX, mode="w+", encoding="utf-8") as out:
+        for path, start, end, m in all_flagged:
+            out.write(f"[STUCK] {path}  steps {start}..{end}  metric={m:.6f}\n")
+
+        print("=== DETECT (window = {}, threshold = {}) ===".format(args.window, thr))
+        if out.tell():
+            out.seek(0)
+            shutil.copyfileobj(out, sys.stdout)
+        else:
+            print("→ stuck 判定は見つかりませんでした。")
 
 def cmd_verify(args: argparse.Namespace) -> None:
     """
@@ -256,10 +841,14 @@ def cmd_verify(args: argparse.Namespace) -> None:
     期待に合えば [OK] を緑で、不一致なら [NG] を赤で表示。
     最後にサマリーを出力。
     """
-    GREEN = "\033[32m"
-    RED = "\033[31m"
-    YELLOW = "\033[33m"
-    RESET = "\033[0m"
+    # 端末でなければ（リダイレクト時など）色コードは付けない
+    if sys.stdout.isatty():
+        GREEN = "\033[32m"
+        RED = "\033[31m"
+        YELLOW = "\033[33m"
+        RESET = "\033[0m"
+    else:
+        GREEN = RED = YELLOW = RESET = ""
 
     def _acc_color(acc_val: float) -> str:
         # しきい値は見やすさ優先（>=95%: green, >=80%: yellow, else red）
@@ -275,63 +864,65 @@ def cmd_verify(args: argparse.Namespace) -> None:
     thr = args.threshold
     win = args.window
 
-    # カウント
-    ok_stuck = ng_stuck = 0
     # per-file 成功率集計用
     per_file: Dict[str, Dict[str, int]] = {}
-    def _pf_inc(path: str, key: str) -> None:
-        d = per_file.setdefault(path, {"ok": 0, "ng": 0})
-        d[key] += 1
-    ok_unstuck = ng_unstuck = 0
 
     print(f"=== VERIFY (window = {win}, threshold = {thr}) ===")
 
-    stuck_metrics = scan_glob_for_metrics(args.stuck_glob, win)
-    unstuck_metrics = scan_glob_for_metrics(args.unstuck_glob, win)
+    scan_opts = _scan_options(args)
 
     log_dir = "log"
     os.makedirs(log_dir, exist_ok=True)
     log_path = os.path.join(log_dir, "verify_log.txt")
-    with open(log_path, "a", encoding="utf-8") as logf:
-        import datetime
+
+    def _verify_side(kind: str, glob_pattern: str, out, logf) -> Tuple[int, int]:
+        """
+        kind 側（"stuck" / "unstuck"）を走査して (OK 数, NG 数) を返す。
+        画面に出す行は out に、ログの行は logf（バッファ付き）にファイルごとに書く。
+        行の組み立ては --quiet でないときだけ行う。
+        """
+        expect_le = kind == "stuck"
+        label = f"[{kind}]".ljust(10)
+        ok_total = ng_total = 0
+        # 全ウィンドウを list にせず、ファイルごとに 1 回の走査で判定・集計・出力する
+        for path, rows in groupby(_iter_metrics(glob_pattern, win, **scan_opts), key=itemgetter(0)):
+            ok = ng = 0
+            for _, start, end, m in rows:
+                if (m <= thr) == expect_le:
+                    ok += 1
+                    if args.quiet:
+                        continue
+                    cond = f"(<= {thr})" if expect_le else f"(> {thr})"
+                    body = f"{path}  steps {start}..{end}  metric={m:.6f}"
+                    out.write(f"{GREEN}[OK]{RESET}{label}{body}  {cond}\n")
+                    logf.write(f"[OK]{label}{body}  {cond}\n")
+                else:
+                    ng += 1
+                    if args.quiet:
+                        continue
+                    cond = f"expected <= {thr}" if expect_le else f"expected > {thr}"
+                    body = f"{path}  steps {start}..{end}  metric={m:.6f}"
+                    out.write(f"{RED}[NG]{RESET}{label}{body}  {cond}\n")
+                    logf.write(f"[NG]{label}{body}  {cond}\n")
+            ok_total += ok
+            ng_total += ng
+            d = per_file.setdefault(path, {"ok": 0, "ng": 0})
+            d["ok"] += ok
+            d["ng"] += ng
+        if ok_total + ng_total == 0:
+            out.write(f"{YELLOW}[WARN]{RESET} {kind} 側で評価可能なウィンドウがありません。\n")
+            logf.write(f"[WARN] {kind} 側で評価可能なウィンドウがありません。\n")
+        return ok_total, ng_total
+
+    with open(log_path, "a", encoding="utf-8", buffering=1 << 16) as logf:
         logf.write(f"=== VERIFY START {datetime.datetime.now().isoformat()} ===\n")
 
-        if not stuck_metrics:
-            msg = f"{YELLOW}[WARN]{RESET} stuck 側で評価可能なウィンドウがありません。"
-            print(msg)
-            logf.write("[WARN] stuck 側で評価可能なウィンドウがありません。\n")
-        for path, start, end, m in stuck_metrics:
-            if m <= thr:
-                ok_stuck += 1
-                _pf_inc(path, "ok")
-                msg = f"{GREEN}[OK]{RESET}[stuck]   {path}  steps {start}..{end}  metric={m:.6f}  (<= {thr})"
-                print(msg)
-                logf.write(f"[OK][stuck]   {path}  steps {start}..{end}  metric={m:.6f}  (<= {thr})\n")
-            else:
-                ng_stuck += 1
-                _pf_inc(path, "ng")
-                msg = f"{RED}[NG]{RESET}[stuck]   {path}  steps {start}..{end}  metric={m:.6f}  expected <= {thr}"
-                print(msg)
-                logf.write(f"[NG][stuck]   {path}  steps {start}..{end}  metric={m:.6f}  expected <= {thr}\n")
-
-        # unstuck 側
-        if not unstuck_metrics:
-            msg = f"{YELLOW}[WARN]{RESET} unstuck 側で評価可能なウィンドウがありません。"
-            print(msg)
-            logf.write("[WARN] unstuck 側で評価可能なウィンドウがありません。\n")
-        for path, start, end, m in unstuck_metrics:
-            if m > thr:
-                ok_unstuck += 1
-                _pf_inc(path, "ok")
-                msg = f"{GREEN}[OK]{RESET}[unstuck] {path}  steps {start}..{end}  metric={m:.6f}  (> {thr})"
-                print(msg)
-                logf.write(f"[OK][unstuck] {path}  steps {start}..{end}  metric={m:.6f}  (> {thr})\n")
-            else:
-                ng_unstuck += 1
-                _pf_inc(path, "ng")
-                msg = f"{RED}[NG]{RESET}[unstuck] {path}  steps {start}..{end}  metric={m:.6f}  expected > {thr}"
-                print(msg)
-                logf.write(f"[NG][unstuck] {path}  steps {start}..{end}  metric={m:.6f}  expected > {thr}\n")
+        # 画面に出す行は進捗バーと混ざらないよう一時ファイルに書いておき、走査後にまとめて出す
+        with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX, mode="w+", encoding="utf-8") as out:
+            ok_stuck, ng_stuck = _verify_side("stuck", args.stuck_glob, out, logf)
+            ok_unstuck, ng_unstuck = _verify_side("unstuck", args.unstuck_glob, out, logf)
+            out.seek(0)
+            shutil.copyfileobj(out, sys.stdout)
 
         total_ok = ok_stuck + ok_unstuck
         total_ng = ng_stuck + ng_unstuck
@@ -357,7 +948,6 @@ def cmd_verify(args: argparse.Namespace) -> None:
             if not rows:
                 return
             # ファイル名はベース名で表示し、親ディレクトリは右側にうすく
-            import os
             name_col = max(24, min(48, max(len(os.path.basename(p)) for p, *_ in rows)))
             print(f"\n[{title}]")
             header = f"{'FILE':<{name_col}}  {'OK':>8}  {'NG':>8}  {'ACC%':>7}"
@@ -391,7 +981,11 @@ def cmd_verify(args: argparse.Namespace) -> None:
             logf.write(f"{p},{ok},{ng},{acc_p:.2f}\n")
         logf.write(f"=== VERIFY END ===\n\n")
 
-def main():
+@functools.lru_cache(maxsize=None)
+def _build_parser() -> argparse.ArgumentParser:
+    """
+    CLI のパーサーを組み立てる（プロセス内で 1 回だけ）。
+    """
     parser = argparse.ArgumentParser(description="Stuck 判定 & しきい値サジェストツール")
     sub = parser.add_subparsers(dest="cmd", required=True)
 
@@ -409,6 +1003,25 @@ def main():
         default="unstuck/**/*.json",
         help="unstuck 側 JSON のグロブパターン",
     )
+    common.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="ファイル読込・計算の並列ワーカー数（省略時は CPU 数、1 で並列化しない）",
+    )
+    common.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="計算結果のキャッシュ（~/.cache/unstuck_checker/）を使わない",
+    )
+    common.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="auto",
+        help="ウィンドウ計算の実装（auto: stuck_kernel をビルド済みなら c、NumPy があれば numpy、無ければ python / "
+        "c: stuck_kernel.c をビルドした共有ライブラリ / numba: 指定したときだけ読み込む / "
+        "exact: statistics.pstdev による参照実装（遅い））",
+    )
 
     p_suggest = sub.add_parser("suggest", parents=[common], help="stuck最大 / unstuck最小 を算出して表示")
     p_suggest.set_defaults(func=cmd_suggest)
@@ -419,15 +1032,33 @@ def main():
 
     p_verify = sub.add_parser("verify", parents=[common], help="ラベルと閾値で期待通りに分類できるか検証（色付きログ）")
     p_verify.add_argument("--threshold", type=float, required=True, help="分類に用いる閾値")
+    p_verify.add_argument("--quiet", action="store_true", help="ウィンドウごとの行を出さずサマリーだけを表示（ログも同様）")
     p_verify.set_defaults(func=cmd_verify)
 
     p_diagnose = sub.add_parser("diagnose", parents=[common], help="ファイルごとの連続長や欠番を表示して原因を診断")
     p_diagnose.set_defaults(func=cmd_diagnose)
 
-    args = parser.parse_args()
+    return parser
+
+def _run(args: argparse.Namespace) -> None:
     if args.window <= 0:
         raise SystemExit("--window は正の整数にしてください。")
+    if args.jobs is not None and args.jobs <= 0:
+        raise SystemExit("--jobs は正の整数にしてください。")
+    if args.engine in ("c", "numba", "numpy") and np is None:
+        raise SystemExit(f"--engine {args.engine} には NumPy が必要です。")
+    if args.engine == "c" and _c_kernel() is None:
+        raise SystemExit(
+            "--engine c には stuck_kernel のビルド（stuck_kernel.c を更新したときは再ビルド）が必要です"
+            "（cc -O3 -march=native -shared -fPIC -o stuck_kernel.so stuck_kernel.c）。"
+        )
+    # numba 自体はワーカー側で必要になった時点で import する
+    if args.engine == "numba" and importlib.util.find_spec("numba") is None:
+        raise SystemExit("--engine numba には numba が必要です。")
     args.func(args)
 
+def main(argv: Optional[List[str]] = None) -> None:
+    _run(_build_parser().parse_args(argv))
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
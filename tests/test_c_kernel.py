@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+stuck_kernel.c をビルドして --engine c を確かめる（C コンパイラと NumPy が無ければスキップ）。
+
+  python -m unittest discover -s tests
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stuck_tool as st
+from test_engines import ExactMixin, _cases
+
+_SRC = os.path.join(os.path.dirname(os.path.abspath(st.__file__)), "stuck_kernel.c")
+
+def _build(src: str, out_dir: str, name: str = "stuck_kernel.so") -> None:
+    subprocess.run(
+        [shutil.which("cc"), "-O2", "-shared", "-fPIC", "-o", os.path.join(out_dir, name), src],
+        check=True,
+    )
+
+@unittest.skipIf(st.np is None or shutil.which("cc") is None, "C コンパイラか NumPy がありません")
+class CKernelTest(ExactMixin, unittest.TestCase):
+    """
+    _c_kernel はスクリプトと同じディレクトリを探すので、一時ディレクトリにビルドして __file__ をそこに向ける。
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        patcher = mock.patch.object(st, "__file__", os.path.join(self.tmp, "stuck_tool.py"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        st._c_kernel.cache_clear()
+        self.addCleanup(st._c_kernel.cache_clear)
+
+    def test_matches_exact(self):
+        _build(_SRC, self.tmp)
+        self.assertIsNotNone(st._c_kernel())
+        self.assertEqual(st._resolve_engine("auto"), "c")
+        for name, series in _cases():
+            for window in (1, 2, 5, 10, 30):
+                with self.subTest(case=name, window=window):
+                    self.assert_matches_exact("c", name, series, window)
+
+    def test_skips_library_without_symbols(self):
+        src = os.path.join(self.tmp, "dummy.c")
+        with open(src, "w") as f:
+            f.write("int unrelated(void) { return 0; }\n")
+        _build(src, self.tmp, "stuck_kernel.cpython-dummy.so")
+        self.assertIsNone(st._c_kernel())
+        self.assertEqual(st._resolve_engine("auto"), "numpy")
+
+    def test_skips_stale_abi(self):
+        with open(_SRC) as f:
+            text = f.read()
+        stale = os.path.join(self.tmp, "stale.c")
+        with open(stale, "w") as f:
+            f.write(text.replace(f"#define STUCK_KERNEL_ABI {st._C_KERNEL_ABI}", "#define STUCK_KERNEL_ABI 0"))
+        _build(stale, self.tmp)
+        self.assertIsNone(st._c_kernel())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+どの --engine でも exact（statistics.pstdev による参照実装）と同じウィンドウ・指標になることを確かめる。
+
+  python -m unittest discover -s tests
+"""
+
+import importlib.util
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stuck_tool as st
+
+# exact との差の許容値（各エンジンの実測の最大誤差は 1e-9 未満）
+TOL = 1e-8
+
+def _series(steps, xs, zs):
+    """
+    load_series_from_json と同じ形（NumPy があれば ndarray）にする。
+    """
+    if st.np is not None:
+        return (
+            st.np.array(steps, dtype=st.np.int64),
+            st.np.array(xs, dtype=st.np.float64),
+            st.np.array(zs, dtype=st.np.float64),
+        )
+    return tuple(steps), tuple(xs), tuple(zs)
+
+def _cases():
+    """
+    (名前, series) のリスト。欠番・重複 step・止まっている区間・大きな座標を含む。
+    """
+    rng = random.Random(0)
+    cases = []
+
+    # 歩き回る区間と止まっている区間が交互に来る（欠番あり）
+    steps, xs, zs = [], [], []
+    x = z = 0.0
+    step = 0
+    for block in range(12):
+        moving = block % 2 == 0
+        for _ in range(rng.randint(5, 40)):
+            if moving:
+                x += rng.uniform(-1.0, 1.0)
+                z += rng.uniform(-1.0, 1.0)
+            steps.append(step)
+            xs.append(x)
+            zs.append(z)
+            step += 1
+        step += rng.randint(0, 3)
+    cases.append(("walk_and_stop", _series(steps, xs, zs)))
+
+    # 同じ step が重複（後勝ち）
+    cases.append(("duplicate_steps", _series(
+        [1, 2, 2, 3, 4, 5, 6, 6, 7],
+        [0.0, 1.0, 2.0, 4.0, 4.5, 0.0, 0.0, 3.0, 1.0],
+        [0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 1.0, 2.0, 0.5],
+    )))
+
+    # 原点から遠い座標での小さな揺れ（累積和の桁落ちが起きやすい）
+    n = 300
+    cases.append(("large_offset", _series(
+        list(range(n)),
+        [1e7 + 0.01 * ((i * 7) % 5) for i in range(n)],
+        [-3e6 + (0.0 if i % 50 < 25 else 0.02 * (i % 3)) for i in range(n)],
+    )))
+
+    # 完全に止まっている
+    cases.append(("constant", _series(list(range(50)), [12.5] * 50, [-7.25] * 50)))
+
+    return cases
+
+def _available_engines():
+    engines = ["python"]
+    if st.np is not None:
+        engines.append("numpy")
+        if importlib.util.find_spec("numba") is not None:
+            engines.append("numba")
+        if st._c_kernel() is not None:
+            engines.append("c")
+    return engines
+
+class ExactMixin:
+    """
+    exact と比べるアサーション（test_c_kernel からも使う）。
+    """
+
+    def assert_matches_exact(self, engine, name, series, window, max_metric=None):
+        expected = list(st.contiguous_window_metrics(series, window, "exact", max_metric))
+        got = list(st.contiguous_window_metrics(series, window, engine, max_metric))
+        msg = f"engine={engine} case={name} window={window} max_metric={max_metric}"
+        self.assertEqual([r[:2] for r in got], [r[:2] for r in expected], msg)
+        for (s, e, m_got), (_, _, m_exp) in zip(got, expected):
+            self.assertAlmostEqual(m_got, m_exp, delta=TOL, msg=f"{msg} steps {s}..{e}")
+
+class EngineEquivalenceTest(ExactMixin, unittest.TestCase):
+    def test_engines_match_exact(self):
+        for engine in _available_engines():
+            for name, series in _cases():
+                for window in (1, 2, 5, 10, 30):
+                    with self.subTest(engine=engine, case=name, window=window):
+                        self.assert_matches_exact(engine, name, series, window)
+
+    def test_max_metric_filter_matches_exact(self):
+        for engine in _available_engines():
+            for name, series in _cases():
+                with self.subTest(engine=engine, case=name):
+                    self.assert_matches_exact(engine, name, series, 5, max_metric=0.05)
+
+    def test_auto_matches_exact(self):
+        for name, series in _cases():
+            with self.subTest(case=name):
+                self.assert_matches_exact("auto", name, series, 10)
+
+    def test_empty_series(self):
+        for engine in _available_engines() + ["exact"]:
+            with self.subTest(engine=engine):
+                self.assertEqual(list(st.contiguous_window_metrics(_series([], [], []), 3, engine)), [])
+
+if __name__ == "__main__":
+    unittest.main()
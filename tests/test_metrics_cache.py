@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+scan 結果のキャッシュ（_CACHE_DIR）の読み書き・掃除を確かめる。
+
+  python -m unittest discover -s tests
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stuck_tool as st
+
+def _write_episode(path: str, n: int, jitter: float) -> None:
+    locs = [
+        {"step": i, "x": 10.0 + jitter * (i % 3), "y": 63.0, "z": -5.0 + jitter * (i % 2)}
+        for i in range(n)
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"episode_id": 1, "locations": locs}, f)
+
+class MetricsCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.data = os.path.join(self.tmp, "data")
+        os.makedirs(self.data)
+        for i, (n, jitter) in enumerate(((40, 0.0), (60, 0.5), (25, 0.01))):
+            _write_episode(os.path.join(self.data, f"ep{i}.json"), n, jitter)
+        self.pattern = os.path.join(self.data, "*.json")
+        root = os.path.join(self.tmp, "cache")
+        for name, value in (
+            ("_CACHE_ROOT", root),
+            ("_CACHE_DIR", os.path.join(root, f"metrics-v{st._CACHE_VERSION}")),
+            ("_cache_writable", True),
+        ):
+            patcher = mock.patch.object(st, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def scan(self, window=5, **kwargs):
+        kwargs.setdefault("use_cache", True)
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            rows = st.scan_glob_for_metrics(self.pattern, window, jobs=1, **kwargs)
+        return rows, out.getvalue()
+
+    def no_compute(self):
+        """
+        これ以降ファイルを計算し直したら失敗させる。
+        """
+        return mock.patch.object(st, "_process_one", side_effect=AssertionError("キャッシュから読むはず"))
+
+    def test_second_scan_is_served_from_cache(self):
+        expected, _ = self.scan(use_cache=False)
+        first, _ = self.scan()
+        with self.no_compute():
+            second, _ = self.scan()
+            filtered, _ = self.scan(max_metric=0.05)
+        self.assertEqual(first, expected)
+        self.assertEqual(second, expected)
+        self.assertEqual(filtered, [r for r in expected if r[3] <= 0.05])
+        self.assertTrue(all(not name.endswith(".tmp") for name in os.listdir(st._CACHE_DIR)))
+
+    def test_engine_and_window_are_part_of_the_key(self):
+        self.scan(engine="python")
+        with self.no_compute(), self.assertRaises(AssertionError):
+            self.scan(engine="exact")
+        with self.no_compute(), self.assertRaises(AssertionError):
+            self.scan(window=6, engine="python")
+
+    def test_modified_file_is_recomputed(self):
+        self.scan()
+        _write_episode(os.path.join(self.data, "ep0.json"), 45, 0.25)
+        rows, _ = self.scan()
+        expected, _ = self.scan(use_cache=False)
+        self.assertEqual(rows, expected)
+
+    def test_unwritable_cache_warns_once_and_still_returns_results(self):
+        blocker = os.path.join(self.tmp, "not_a_dir")
+        with open(blocker, "w"):
+            pass
+        with mock.patch.object(st, "_CACHE_DIR", os.path.join(blocker, "metrics")):
+            rows, out = self.scan()
+        expected, _ = self.scan(use_cache=False)
+        self.assertEqual(rows, expected)
+        self.assertEqual(out.count("キャッシュに書き込めませんでした"), 1)
+
+    def test_prune_keeps_cache_under_the_limit(self):
+        stale = os.path.join(st._CACHE_ROOT, "metrics-v0")
+        os.makedirs(stale)
+        self.scan(window=5)
+        one_scan = sum(e.stat().st_size for e in os.scandir(st._CACHE_DIR))
+        with mock.patch.object(st, "_CACHE_MAX_BYTES", one_scan):
+            for window in (6, 7, 8):
+                self.scan(window=window)
+        total = sum(e.stat().st_size for e in os.scandir(st._CACHE_DIR))
+        self.assertLessEqual(total, one_scan)
+        self.assertFalse(os.path.exists(stale))
+        # 最後に使った window は残っている
+        with self.no_compute():
+            self.scan(window=8)
+
+if __name__ == "__main__":
+    unittest.main()